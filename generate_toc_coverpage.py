@@ -7,10 +7,18 @@ a PDF containing a table of contents and cover pages for each attachment.
 """
 
 import os
+import sys
+import logging
+import traceback
+from functools import lru_cache
+from itertools import accumulate
 import openpyxl
-from weasyprint import HTML
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 from datetime import datetime
-from src.pdf.pdf_merger import locate_toc_page
+from src.config.constants import PDF_SAVE_OPTIONS
+from src.utils.logger import setup_logger
+from src.pdf.pdf_merger import locate_toc_page, get_header_text, find_attachment_rects, find_cover_heading, TEXT_SCAN_FLAGS
 import fitz  # PyMuPDF
 
 # File paths
@@ -18,115 +26,18 @@ EXCEL_FILE = os.path.join('input-files', 'input-pdfs.xlsx')
 TITLE_PAGE = os.path.join('input-files', 'title-page.pdf')
 FOREWORD_PAGE = os.path.join('input-files', 'foreword.pdf')
 OUTPUT_TOC = os.path.join('output-files', 'toc-coverpage.pdf')
+OUTPUT_HTML = os.path.join('output-files', 'toc-debug.html')
 OUTPUT_PDF = os.path.join('output-files', 'weasyoutput.pdf')
 
-def read_attachment_data():
-    """
-    Read attachment data from Excel file.
-    
-    Returns:
-        list: List of dictionaries containing attachment data
-    """
-    print(f"Opening Excel file: {EXCEL_FILE}")
-    
-    # Check if input file exists
-    if not os.path.exists(EXCEL_FILE):
-        raise FileNotFoundError(f"Excel file not found: {EXCEL_FILE}")
-    
-    workbook = openpyxl.load_workbook(EXCEL_FILE)
-    
-    # Check if sheet exists
-    if "Attachments Prep" not in workbook.sheetnames:
-        raise ValueError(f"Sheet 'Attachments Prep' not found in {EXCEL_FILE}")
-    
-    sheet = workbook["Attachments Prep"]
-    
-    # Find headers
-    headers = []
-    for cell in sheet[1]:
-        headers.append(cell.value)
-    
-    # Field mapping (convert sheet headers to our standardized field names)
-    field_mapping = {
-        'Attachment Number': ['Attachment Number', 'Attachment #', 'Number'],
-        'Title': ['Title', 'Document Title'],
-        'Page count': ['Page count', 'Pages', 'Page Count'],
-        'Additional Remarks about File': ['Additional Remarks about File', 'Remarks', 'Notes'],
-        'Body': ['Body', 'Description', 'Body (Description)'],
-        'Filename Reference': ['Filename Reference', 'Filename', 'File'],
-        'Date (time Pacific)': ['Date (time Pacific)', 'Date', 'Document Date'],
-        'Language': ['Language', 'Lang', 'Language Code'],
-        'Category': ['Category', 'Document Category'],
-        'Document Type': ['Document Type', 'Type'],
-        'Confidentiality': ['Confidentiality', 'Confidential'],
-        'Source URL (when available)': ['Source URL (when available)', 'Source URL', 'URL'],
-        'Exclude': ['Exclude', 'Skip']
-    }
-    
-    # Map headers to indices
-    header_indices = {}
-    for field, possible_headers in field_mapping.items():
-        for i, header in enumerate(headers):
-            if header and any(possible_match.lower() == header.lower() for possible_match in possible_headers):
-                header_indices[field] = i
-                break
-    
-    # Print detected headers
-    print("Detected headers:")
-    for field, idx in header_indices.items():
-        print(f"  {field} -> column {idx+1}")
-    
-    # Check if we found all required fields
-    required_fields = ['Attachment Number', 'Title']
-    for field in required_fields:
-        if field not in header_indices:
-            raise ValueError(f"Required field '{field}' not found in Excel headers")
-    
-    data = []
-    # Start from row 2 (skip header)
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        # Skip empty rows
-        if not any(row):
-            continue
-        
-        # Skip rows marked as excluded
-        exclude_idx = header_indices.get('Exclude')
-        if exclude_idx is not None and row[exclude_idx] in (True, 'TRUE', 'True', 'true', 'YES', 'Yes', 'yes', '1', 1):
-            continue
-        
-        attachment = {}
-        for field, idx in header_indices.items():
-            if field != 'Exclude':  # We've already used this field for filtering
-                value = row[idx] if idx < len(row) else None
-                
-                # Format date if it's a datetime object (remove the 00:00:00 time if it's midnight)
-                if field == 'Date (time Pacific)' and value:
-                    if isinstance(value, datetime):
-                        # Only show the time if it's not midnight
-                        if value.hour == 0 and value.minute == 0 and value.second == 0:
-                            value = value.strftime('%Y-%m-%d')
-                        else:
-                            value = value.strftime('%Y-%m-%d %H:%M:%S')
-                
-                attachment[field] = value
-        
-        # Set default value for Language if not found
-        if 'Language' not in attachment or not attachment['Language']:
-            attachment['Language'] = 'EN'
-        
-        data.append(attachment)
-    
-    print(f"Found {len(data)} attachments")
-    return data
+# Write buffer for the streamed HTML so the many small chunks reach disk in a few large writes
+HTML_WRITE_BUFFER = 1 << 16
 
-def get_css_styles():
-    """
-    Return the CSS styles for the HTML document.
-    
-    Returns:
-        str: CSS styles
-    """
-    return """
+# Per-attachment diagnostics go through the logger so they cost nothing unless DEBUG is enabled;
+# a child of the application logger configured by setup_logger in main()
+logger = logging.getLogger('pdf_generator.toc')
+
+# CSS styles for the HTML document
+CSS_STYLES = """
         @page {
             size: 8.5in 11in;
             margin: 0.5in 0.5in 0.5in 0.5in;
@@ -286,6 +197,157 @@ def get_css_styles():
         }
     """
 
+# Translation table for escaping text interpolated into HTML (same
+# replacements as html.escape, applied in a single pass)
+HTML_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
+
+# Static HTML scaffolding; only the per-attachment parts are built per run
+HTML_PREFIX = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Table of Contents and Cover Pages</title>
+</head>
+<body>
+    """
+
+HTML_SUFFIX = """
+</body>
+</html>
+    """
+
+TOC_PREFIX = """
+    <div class="toc-container">
+        <h1>Table of Contents</h1>
+        <table class="toc-table">
+    """
+
+TOC_ROW_TEMPLATE = """
+        <tr id="toc-entry-{num}">
+            <td class="attachment-num">
+                <a class="toc-link" href="#cover-{num}">Attachment {num}</a>
+            </td>
+            <td class="attachment-title">{title}</td>
+            <td class="page-num">{page}</td>
+        </tr>
+        """
+
+TOC_SUFFIX = """
+        </table>
+    </div>
+    """
+
+# Font discovery and stylesheet parsing are done once at import time and
+# reused for every render
+FONT_CONFIG = FontConfiguration()
+STYLESHEET = CSS(string=CSS_STYLES, font_config=FONT_CONFIG)
+
+def read_attachment_data():
+    """
+    Read attachment data from Excel file.
+    
+    Returns:
+        list: List of dictionaries containing attachment data
+    """
+    print(f"Opening Excel file: {EXCEL_FILE}")
+    
+    # Check if input file exists
+    if not os.path.exists(EXCEL_FILE):
+        raise FileNotFoundError(f"Excel file not found: {EXCEL_FILE}")
+    
+    workbook = openpyxl.load_workbook(EXCEL_FILE)
+    
+    # Check if sheet exists
+    if "Attachments Prep" not in workbook.sheetnames:
+        raise ValueError(f"Sheet 'Attachments Prep' not found in {EXCEL_FILE}")
+    
+    sheet = workbook["Attachments Prep"]
+    
+    # Find headers
+    headers = []
+    for cell in sheet[1]:
+        headers.append(cell.value)
+    
+    # Field mapping (convert sheet headers to our standardized field names)
+    field_mapping = {
+        'Attachment Number': ['Attachment Number', 'Attachment #', 'Number'],
+        'Title': ['Title', 'Document Title'],
+        'Page count': ['Page count', 'Pages', 'Page Count'],
+        'Additional Remarks about File': ['Additional Remarks about File', 'Remarks', 'Notes'],
+        'Body': ['Body', 'Description', 'Body (Description)'],
+        'Filename Reference': ['Filename Reference', 'Filename', 'File'],
+        'Date (time Pacific)': ['Date (time Pacific)', 'Date', 'Document Date'],
+        'Language': ['Language', 'Lang', 'Language Code'],
+        'Category': ['Category', 'Document Category'],
+        'Document Type': ['Document Type', 'Type'],
+        'Confidentiality': ['Confidentiality', 'Confidential'],
+        'Source URL (when available)': ['Source URL (when available)', 'Source URL', 'URL'],
+        'Exclude': ['Exclude', 'Skip']
+    }
+    
+    # Map headers to indices
+    header_indices = {}
+    for field, possible_headers in field_mapping.items():
+        for i, header in enumerate(headers):
+            if header and any(possible_match.lower() == header.lower() for possible_match in possible_headers):
+                header_indices[field] = i
+                break
+    
+    # Print detected headers
+    print("Detected headers:")
+    for field, idx in header_indices.items():
+        print(f"  {field} -> column {idx+1}")
+    
+    # Check if we found all required fields
+    required_fields = ['Attachment Number', 'Title']
+    for field in required_fields:
+        if field not in header_indices:
+            raise ValueError(f"Required field '{field}' not found in Excel headers")
+    
+    data = []
+    # Start from row 2 (skip header)
+    for row in sheet.iter_rows(min_row=2, values_only=True):
+        # Skip empty rows
+        if not any(row):
+            continue
+        
+        # Skip rows marked as excluded
+        exclude_idx = header_indices.get('Exclude')
+        if exclude_idx is not None and row[exclude_idx] in (True, 'TRUE', 'True', 'true', 'YES', 'Yes', 'yes', '1', 1):
+            continue
+        
+        attachment = {}
+        for field, idx in header_indices.items():
+            if field != 'Exclude':  # We've already used this field for filtering
+                value = row[idx] if idx < len(row) else None
+                
+                # Format date if it's a datetime object (remove the 00:00:00 time if it's midnight)
+                if field == 'Date (time Pacific)' and value:
+                    if isinstance(value, datetime):
+                        # Only show the time if it's not midnight
+                        if value.hour == 0 and value.minute == 0 and value.second == 0:
+                            value = value.strftime('%Y-%m-%d')
+                        else:
+                            value = value.strftime('%Y-%m-%d %H:%M:%S')
+                
+                attachment[field] = value
+        
+        # Set default value for Language if not found
+        if 'Language' not in attachment or not attachment['Language']:
+            attachment['Language'] = 'EN'
+        
+        data.append(attachment)
+    
+    print(f"Found {len(data)} attachments")
+    return data
+
+@lru_cache(maxsize=None, typed=True)
 def normalize_attachment_number(num):
     """
     Normalize attachment number to integer if possible.
@@ -300,6 +362,7 @@ def normalize_attachment_number(num):
         return int(num)
     return num
 
+@lru_cache(maxsize=None, typed=True)
 def normalize_page_count(count):
     """
     Normalize page count to integer if possible.
@@ -319,6 +382,64 @@ def normalize_page_count(count):
             return 1
     return count
 
+def sort_attachments(attachments):
+    """
+    Sort attachments numerically by attachment number.
+    
+    Each attachment's numeric key is computed once up front; numbers that
+    cannot be read as a number sort after all numeric ones.
+    
+    Args:
+        attachments: List of dictionaries containing attachment data
+    
+    Returns:
+        list: The attachments sorted by attachment number
+    """
+    decorated = []
+    for index, attachment in enumerate(attachments):
+        try:
+            key = float(attachment.get('Attachment Number', 0))
+        except (ValueError, TypeError):
+            key = float('inf')
+        decorated.append((key, index, attachment))
+    
+    decorated.sort()
+    return [attachment for _, _, attachment in decorated]
+
+def escape_value(value):
+    """
+    Escape a spreadsheet value for safe interpolation into HTML.
+    
+    Args:
+        value: The raw cell value
+    
+    Returns:
+        str: HTML-escaped string, or an empty string for empty values
+    """
+    if not value:
+        return ''
+    return str(value).translate(HTML_ESCAPE_TABLE)
+
+@lru_cache(maxsize=None)
+def get_pdf_page_count(path):
+    """
+    Determine the number of pages in a PDF file.
+    
+    The result is cached so each file is only opened and parsed once per run.
+    
+    Args:
+        path: Path to the PDF file
+    
+    Returns:
+        int: Number of pages in the PDF, or 0 if the file does not exist
+    """
+    if os.path.exists(path):
+        pdf = fitz.open(path)
+        count = len(pdf)
+        pdf.close()
+        return count
+    return 0
+
 def determine_foreword_page_count():
     """
     Determine the number of pages in the foreword document.
@@ -326,259 +447,260 @@ def determine_foreword_page_count():
     Returns:
         int: Number of pages in the foreword
     """
-    if os.path.exists(FOREWORD_PAGE):
-        foreword_pdf = fitz.open(FOREWORD_PAGE)
-        count = len(foreword_pdf)
-        foreword_pdf.close()
-        return count
-    return 0
+    return get_pdf_page_count(FOREWORD_PAGE)
+
+def open_pdf_if_exists(path):
+    """
+    Open a PDF file if it exists.
+    
+    Args:
+        path: Path to the PDF file
+    
+    Returns:
+        fitz.Document: The opened document, or None if the file does not exist
+    """
+    if os.path.exists(path):
+        return fitz.open(path)
+    return None
+
+def find_toc_page(pdf_doc, max_pages):
+    """
+    Find the page holding the "Table of Contents" heading.
+    
+    Only the first max_pages pages are searched, since the TOC is at the
+    front of the document.
+    
+    Args:
+        pdf_doc: PyMuPDF document
+        max_pages: Number of leading pages to search
+    
+    Returns:
+        int: Index of the TOC page, or -1 if it was not found
+    """
+    for page_idx, page in enumerate(pdf_doc.pages(0, max_pages)):
+        if page.search_for("Table of Contents"):
+            return page_idx
+    return -1
 
-def calculate_page_map(attachments):
+def calculate_page_map(attachments, foreword_pages=None):
     """
     Calculate page numbers for each attachment.
     
     Args:
         attachments: List of dictionaries containing attachment data
+        foreword_pages: Page count of the foreword (read from FOREWORD_PAGE when not given)
     
     Returns:
         dict: Mapping of attachment numbers to page numbers
     """
-    sorted_data = sorted(attachments, key=lambda x: x.get('Attachment Number', 0))
+    sorted_data = sort_attachments(attachments)
     
     # Start page is calculated based on Title page + TOC pages + first cover
     toc_entries = len(sorted_data)
     toc_pages = max(1, min(3, (toc_entries + 14) // 15))  # Estimate 15 entries per page
-    foreword_pages = determine_foreword_page_count()
+    if foreword_pages is None:
+        foreword_pages = determine_foreword_page_count()
     start_page = 1 + foreword_pages + toc_pages + 1  # Title page + Foreword + TOC pages + first cover page
     
-    # Track page counts for each attachment
-    current_page = start_page
-    page_map = {}
+    attachment_nums = [str(normalize_attachment_number(a.get('Attachment Number', ''))) for a in sorted_data]
     
-    for attachment in sorted_data:
-        attachment_num = normalize_attachment_number(attachment.get('Attachment Number', ''))
-        
-        # Store the page number for this attachment
-        page_map[str(attachment_num)] = current_page
-        
-        # Get the number of content pages for this attachment
-        page_count = normalize_page_count(attachment.get('Page count', 1))
-        
-        # Move to the next cover page
-        current_page += page_count + 1  # Add content pages plus next cover
+    # Each attachment advances the page by its content pages plus the next cover
+    increments = [normalize_page_count(a.get('Page count', 1)) + 1 for a in sorted_data]
     
-    return page_map
+    # Running sum of the increments gives each attachment's cover page number
+    start_pages = accumulate(increments[:-1], initial=start_page)
+    
+    return dict(zip(attachment_nums, start_pages))
 
-def generate_toc_html(sorted_data, page_map):
+def generate_toc_html(rows):
     """
     Generate HTML for the table of contents.
     
     Args:
-        sorted_data: Sorted list of attachment data
-        page_map: Mapping of attachment numbers to page numbers
+        rows: Sorted list of (attachment, attachment number, escaped title, page number) tuples
     
     Returns:
         str: HTML for the table of contents
     """
-    html = """
-    <div class="toc-container">
-        <h1>Table of Contents</h1>
-        <table class="toc-table">
-    """
+    parts = [TOC_PREFIX]
     
     # Add a TOC entry for each attachment
-    for attachment in sorted_data:
-        attachment_num = normalize_attachment_number(attachment.get('Attachment Number', ''))
-        title = attachment.get('Title', 'Untitled')
-        
-        # Get the page number for this attachment
-        page_number = page_map.get(str(attachment_num), 0)
-        
-        # Add the TOC entry with table structure
-        html += f"""
-        <tr id="toc-entry-{attachment_num}">
-            <td class="attachment-num">
-                <a class="toc-link" href="#cover-{attachment_num}">Attachment {attachment_num}</a>
-            </td>
-            <td class="attachment-title">{title}</td>
-            <td class="page-num">{page_number}</td>
-        </tr>
-        """
+    for attachment, attachment_num, title, page_number in rows:
+        parts.append(TOC_ROW_TEMPLATE.format(num=attachment_num, title=title, page=page_number))
     
     # Close the TOC section
-    html += """
-        </table>
-    </div>
-    """
+    parts.append(TOC_SUFFIX)
     
-    return html
+    return "".join(parts)
 
-def generate_cover_page_html(attachment, page_number):
+def generate_cover_page_html(attachment, attachment_num, title, page_number):
     """
     Generate HTML for a single cover page.
     
     Args:
         attachment: Dictionary containing attachment data
+        attachment_num: The normalized, HTML-escaped attachment number
+        title: The HTML-escaped attachment title
         page_number: The page number to display on the cover page
     
     Returns:
         str: HTML for the cover page
     """
-    attachment_num = normalize_attachment_number(attachment.get('Attachment Number', ''))
-    title = attachment.get('Title', 'Untitled')
-    
     # Extract additional fields (if available)
-    date = attachment.get('Date (time Pacific)', '')
-    category = attachment.get('Category', '')
-    document_type = attachment.get('Document Type', '')
-    page_count = attachment.get('Page count', '')
-    confidentiality = attachment.get('Confidentiality', '')
-    body = attachment.get('Body', '')
-    remarks = attachment.get('Additional Remarks about File', '')
-    source_url = attachment.get('Source URL (when available)', '')
-    
-    html = f"""
+    date = escape_value(attachment.get('Date (time Pacific)', ''))
+    category = escape_value(attachment.get('Category', ''))
+    document_type = escape_value(attachment.get('Document Type', ''))
+    page_count = escape_value(attachment.get('Page count', ''))
+    confidentiality = escape_value(attachment.get('Confidentiality', ''))
+    body = escape_value(attachment.get('Body', ''))
+    remarks = escape_value(attachment.get('Additional Remarks about File', ''))
+    source_url = escape_value(attachment.get('Source URL (when available)', ''))
+    
+    parts = [f"""
     <div class="cover-page" id="cover-{attachment_num}">
         <div class="cover-number">Attachment {attachment_num}</div>
         <div class="cover-title">{title}</div>
         
         <table class="cover-metadata">
-    """
+    """]
     
     # Only add fields that have values
     if date:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Date (time Pacific):</th>
             <td>{date}</td>
         </tr>
-        """
+        """)
         
     if category:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Category:</th>
             <td>{category}</td>
         </tr>
-        """
+        """)
         
     if document_type:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Document Type:</th>
             <td>{document_type}</td>
         </tr>
-        """
+        """)
         
     if page_count:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Page Count:</th>
             <td>{page_count}</td>
         </tr>
-        """
+        """)
         
     if confidentiality:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Confidentiality:</th>
             <td>{confidentiality}</td>
         </tr>
-        """
+        """)
         
     if source_url:
-        html += f"""
+        parts.append(f"""
         <tr>
             <th>Source:</th>
             <td>{source_url}</td>
         </tr>
-        """
+        """)
         
-    html += """
+    parts.append("""
         </table>
-    """
+    """)
     
     # Add body/description if available
     if body:
-        html += f"""
+        parts.append(f"""
         <div class="cover-description-header">Description:</div>
         <div class="cover-description">
             {body}
         </div>
-        """
+        """)
         
     # Add remarks if available
     if remarks:
-        html += f"""
+        parts.append(f"""
         <div class="cover-remarks">
             <strong>Additional Remarks:</strong><br>
             {remarks}
         </div>
-        """
+        """)
     
     # Add page number at the bottom
-    html += f"""
+    parts.append(f"""
         <div class="cover-info">
             Page {page_number}
         </div>
     </div>
-    """
+    """)
     
-    return html
+    return "".join(parts)
 
-def generate_html(data):
+def generate_html(data, output_path=OUTPUT_HTML, page_map=None):
     """
-    Generate HTML content for the PDF.
+    Generate HTML content for the PDF and write it to a file.
+    
+    The document is written chunk by chunk as it is generated, so the full
+    HTML is never held in memory as a single string.
     
     Args:
         data: List of dictionaries containing attachment data
+        output_path: Path of the HTML file to write
+        page_map: Precomputed mapping of attachment numbers to page numbers
+                  (calculated from data when not given)
         
     Returns:
-        String containing HTML content
+        str: Path of the written HTML file
     """
     # Sort the data by attachment number
-    sorted_data = sorted(data, key=lambda x: x.get('Attachment Number', 0))
-    
-    # Calculate page numbers for each attachment
-    page_map = calculate_page_map(sorted_data)
+    sorted_data = sort_attachments(data)
     
-    # Start building the HTML document
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Table of Contents and Cover Pages</title>
-    <style>{get_css_styles()}</style>
-</head>
-<body>
-    """
-    
-    # Add Table of Contents
-    html += generate_toc_html(sorted_data, page_map)
+    # Calculate page numbers for each attachment unless the caller already did
+    if page_map is None:
+        page_map = calculate_page_map(sorted_data)
     
-    # Add cover pages for each attachment
+    # Normalize and escape each attachment once for both the TOC and the cover pages
+    rows = []
     for attachment in sorted_data:
         attachment_num = normalize_attachment_number(attachment.get('Attachment Number', ''))
+        title = str(attachment.get('Title', 'Untitled')).translate(HTML_ESCAPE_TABLE)
         page_number = page_map.get(str(attachment_num), 0)
-        html += generate_cover_page_html(attachment, page_number)
+        rows.append((attachment, str(attachment_num).translate(HTML_ESCAPE_TABLE), title, page_number))
     
-    # Close the HTML document
-    html += """
-</body>
-</html>
-    """
+    with open(output_path, 'w', encoding='utf-8', buffering=HTML_WRITE_BUFFER) as f:
+        # Start the HTML document
+        f.write(HTML_PREFIX)
+        
+        # Add Table of Contents
+        f.write(generate_toc_html(rows))
+        
+        # Add cover pages for each attachment
+        for attachment, attachment_num, title, page_number in rows:
+            f.write(generate_cover_page_html(attachment, attachment_num, title, page_number))
+        
+        # Close the HTML document
+        f.write(HTML_SUFFIX)
     
-    # Save the HTML to a file for debugging
-    with open('output-files/toc-debug.html', 'w') as f:
-        f.write(html)
-    print("Saved HTML to output-files/toc-debug.html for debugging")
+    print(f"Saved HTML to {output_path} for debugging")
     
-    return html
+    return output_path
 
 def main():
     """
     Main function to run the script.
     """
+    # Configure the application logger; pass --debug to see per-attachment diagnostics
+    setup_logger(level=logging.DEBUG if '--debug' in sys.argv[1:] else logging.INFO)
+    
     # Ensure output directory exists
     os.makedirs('output-files', exist_ok=True)
     
@@ -586,30 +708,24 @@ def main():
         # Read data from Excel
         attachments = read_attachment_data()
         
-        # Print attachment page counts for debugging
-        print("\nDEBUG - Attachment page counts:")
+        # Normalize each attachment's number and page count once for all passes below
+        normalized_attachments = [
+            (normalize_attachment_number(attachment.get('Attachment Number', '')),
+             normalize_page_count(attachment.get('Page count', 1)))
+            for attachment in attachments
+        ]
+        
+        # Log attachment page counts for debugging
+        logger.debug("Attachment page counts:")
         total_content_pages = 0
         
         # First count actual page counts
         attachment_pages = {}
-        for attachment in attachments:
-            attachment_num = attachment.get('Attachment Number', '')
-            if isinstance(attachment_num, float) and attachment_num.is_integer():
-                attachment_num = int(attachment_num)
-            
-            page_count = attachment.get('Page count', 1)
-            if isinstance(page_count, float) and page_count.is_integer():
-                page_count = int(page_count)
-            elif not isinstance(page_count, int):
-                try:
-                    page_count = int(float(page_count))
-                except (ValueError, TypeError):
-                    page_count = 1
-                    
+        for attachment_num, page_count in normalized_attachments:
             # Store page count and add to total
             attachment_pages[str(attachment_num)] = page_count
             total_content_pages += page_count  # Just the content pages
-            print(f"Attachment {attachment_num}: {page_count} pages of content")
+            logger.debug("Attachment %s: %s pages of content", attachment_num, page_count)
         
         # Calculate total pages including cover pages
         total_attachment_pages = total_content_pages + len(attachments)  # Content + cover pages
@@ -618,8 +734,10 @@ def main():
         toc_entries = len(attachments)
         toc_pages = max(1, min(3, (toc_entries + 14) // 15))  # Estimate 15 entries per page
         
-        # Check if foreword exists
-        foreword_pages = determine_foreword_page_count()
+        # Open the front matter once; the same documents are counted here and merged below
+        title_pdf = open_pdf_if_exists(TITLE_PAGE)
+        foreword_pdf = open_pdf_if_exists(FOREWORD_PAGE)
+        foreword_pages = len(foreword_pdf) if foreword_pdf is not None else 0
         
         # Total estimated pages: Title page + Foreword + TOC pages + attachment pages (content + covers)
         estimated_total = 1 + foreword_pages + toc_pages + total_attachment_pages
@@ -634,81 +752,59 @@ def main():
         print(f"Estimated total pages: {estimated_total}")
         
         # Now verify our page number calculations
-        print("\nDEBUG - Page numbering verification:")
-        
-        # Calculate expected page numbers
-        start_page = 1 + foreword_pages + toc_pages + 1  # Title page + Foreword + TOC pages + first cover
-        current_page = start_page
+        logger.debug("Page numbering verification:")
         
         # Page map to use for both TOC display and bookmarks
-        page_map = {}
+        page_map = calculate_page_map(attachments, foreword_pages)
         
-        for attachment in attachments:
-            attachment_num = attachment.get('Attachment Number', '')
-            if isinstance(attachment_num, float) and attachment_num.is_integer():
-                attachment_num = int(attachment_num)
-                
-            page_map[str(attachment_num)] = current_page
-            print(f"Attachment {attachment_num} cover page should be on page {current_page}")
-            
-            # Move to next cover page
-            page_count = attachment_pages.get(str(attachment_num), 1)
-            current_page += page_count + 1  # Current content + next cover
+        for attachment_num, cover_page in page_map.items():
+            logger.debug("Attachment %s cover page should be on page %s", attachment_num, cover_page)
         
-        # Generate HTML 
-        html_content = generate_html(attachments)
+        # Generate HTML from the same page map
+        html_path = generate_html(attachments, page_map=page_map)
         
         # Convert HTML to PDF using WeasyPrint
         print(f"\nGenerating TOC and cover pages: {OUTPUT_TOC}")
-        HTML(string=html_content).write_pdf(OUTPUT_TOC)
+        toc_pdf_bytes = HTML(filename=html_path).write_pdf(stylesheets=[STYLESHEET], font_config=FONT_CONFIG)
+        with open(OUTPUT_TOC, 'wb') as f:
+            f.write(toc_pdf_bytes)
         
-        # Check TOC page count
-        toc_doc = fitz.open(OUTPUT_TOC)
+        # Open the rendered PDF from memory rather than reading back the file just written
+        toc_doc = fitz.open("pdf", toc_pdf_bytes)
         actual_toc_pages = len(toc_doc)
         
-        # Check for links in the TOC PDF
-        print("\nDEBUG - Checking links in TOC PDF:")
+        # Find TOC page within the pages the TOC is estimated to occupy
+        toc_page_idx = find_toc_page(toc_doc, toc_pages)
+        
+        # Only the TOC pages carry links, so check those instead of every cover page
+        logger.debug("Checking links in TOC PDF:")
         toc_links_found = 0
-        for page_num in range(toc_doc.page_count):
-            page = toc_doc[page_num]
+        first_toc_page = max(toc_page_idx, 0)
+        for page_num, page in enumerate(toc_doc.pages(first_toc_page, toc_pages), first_toc_page):
             links = page.get_links()
             if links:
                 toc_links_found += len(links)
-                print(f"Found {len(links)} links on page {page_num+1}")
+                logger.debug("Found %d links on page %d", len(links), page_num + 1)
                 for idx, link in enumerate(links):
-                    print(f"  Link {idx+1}: {link}")
+                    logger.debug("  Link %d: %s", idx + 1, link)
         
         if toc_links_found == 0:
             print("WARNING: No links found in TOC PDF. Adding links manually...")
             
-            # Find TOC page 
-            toc_page_idx = -1
-            for page_idx in range(toc_doc.page_count):
-                page = toc_doc[page_idx]
-                text = page.get_text()
-                if "Table of Contents" in text:
-                    toc_page_idx = page_idx
-                    print(f"Found TOC on page {page_idx+1}")
-                    break
-            
             if toc_page_idx >= 0:
+                print(f"Found TOC on page {toc_page_idx+1}")
+                
                 # For each attachment, find text "Attachment X" on TOC page and create a link to the cover page
                 toc_page = toc_doc[toc_page_idx]
+                attachment_rects = find_attachment_rects(toc_page)
                 links_added = 0
                 
-                for attachment in attachments:
-                    attachment_num = attachment.get('Attachment Number', '')
-                    if isinstance(attachment_num, float) and attachment_num.is_integer():
-                        attachment_num = int(attachment_num)
-                    
+                for attachment_num, _ in normalized_attachments:
                     # Find text on the page
                     search_text = f"Attachment {attachment_num}"
-                    rects = toc_page.search_for(search_text)
+                    rect = attachment_rects.get(str(attachment_num))
                     
-                    if rects:
-                        # The first occurrence is the one in the TOC
-                        rect = rects[0]
-                        
+                    if rect is not None:
                         # Calculate target page
                         target_page = toc_page_idx + 1 + attachment_num  # Simple heuristic
                         if target_page < toc_doc.page_count:
@@ -723,103 +819,128 @@ def main():
                             
                             toc_page.insert_link(link)
                             links_added += 1
-                            print(f"Added link for {search_text} pointing to page {target_page+1}")
+                            logger.debug("Added link for %s pointing to page %d", search_text, target_page + 1)
                 
                 if links_added > 0:
                     print(f"Added {links_added} links to the TOC")
-                    toc_doc.save(OUTPUT_TOC)
+                
+                # Drop every reference to the TOC page (including the link check
+                # loop's) so its new links are written into toc_doc; insert_pdf
+                # and save do not pick up links of a page that is still in use
+                page = toc_page = None
         
-        toc_doc.close()
+        # Keep toc_doc open: the added links live on the open document and are
+        # persisted once, by the single save of OUTPUT_PDF below
         print(f"Actual TOC PDF page count: {actual_toc_pages}")
         
         # Check if title page exists
-        if os.path.exists(TITLE_PAGE):
+        if title_pdf is not None:
             print(f"Adding title page from: {TITLE_PAGE}")
             
             # Create a new PDF with title page followed by TOC and cover pages
             merged_pdf = fitz.open()
             
             # Add the title page
-            title_pdf = fitz.open(TITLE_PAGE)
             title_page_count = len(title_pdf)
             merged_pdf.insert_pdf(title_pdf)
             print(f"Title page has {title_page_count} page(s)")
             
             # Add the foreword if it exists
             foreword_page_offset = title_page_count
-            if os.path.exists(FOREWORD_PAGE):
+            if foreword_pdf is not None:
                 print(f"Adding foreword from: {FOREWORD_PAGE}")
-                foreword_pdf = fitz.open(FOREWORD_PAGE)
-                foreword_page_count = len(foreword_pdf)
+                foreword_page_count = foreword_pages
                 merged_pdf.insert_pdf(foreword_pdf)
                 print(f"Foreword has {foreword_page_count} page(s)")
                 foreword_page_offset = title_page_count
             else:
                 foreword_page_count = 0
             
-            # Add the TOC and cover pages
-            toc_pdf = fitz.open(OUTPUT_TOC)
-            toc_page_count = len(toc_pdf)
-            merged_pdf.insert_pdf(toc_pdf)
+            # Add the TOC and cover pages from the already open document
+            merged_pdf.insert_pdf(toc_doc)
             
             # Create bookmarks for the PDF
             toc = []
             
+            # Bookmark pages are 1-based, as set_toc expects
             # Add title page bookmark
-            toc.append([1, "Title Page", 0])
+            toc.append([1, "Title Page", 1])
             
             # Add foreword bookmark if it exists
-            if os.path.exists(FOREWORD_PAGE):
-                toc.append([1, "Foreword", foreword_page_offset])
+            if foreword_pdf is not None:
+                toc.append([1, "Foreword", foreword_page_offset + 1])
             
             # Find TOC page in the merged document
             toc_page_idx = title_page_count + foreword_page_count
-            toc.append([1, "Table of Contents", toc_page_idx])
+            toc.append([1, "Table of Contents", toc_page_idx + 1])
+            
+            # The TOC pages list every attachment as well, so cover pages are
+            # only looked for after the last of them
+            _, _, toc_doc_pages = locate_toc_page(toc_doc)
+            first_cover_idx = toc_page_idx + (toc_doc_pages[-1] + 1 if toc_doc_pages else 0)
             
             # Map actual cover page indices in the merged document
             actual_cover_pages = {}
             
-            # Find all cover pages by text pattern
-            for page_num in range(merged_pdf.page_count):
-                page = merged_pdf[page_num]
-                text = page.get_text()
+            # Look up titles by normalized attachment number
+            attachment_titles = {
+                str(attachment_num): attachment.get('Title', 'Untitled')
+                for (attachment_num, _), attachment in zip(normalized_attachments, attachments)
+            }
+            
+            # Find all cover pages by text pattern; they all follow the TOC
+            for page_num, page in enumerate(merged_pdf.pages(first_cover_idx), first_cover_idx):
+                # The cover heading sits near the top; skip full extraction otherwise
+                header = get_header_text(page)
+                if "Attachment " not in header:
+                    continue
                 
-                for attachment_num in attachment_pages.keys():
-                    if f"Attachment {attachment_num}" in text:
-                        # Make sure this isn't just a mention in another cover page
-                        if "Page" in text and f"Attachment {attachment_num}" in text.split('\n')[:5]:
-                            actual_cover_pages[attachment_num] = page_num
-                            # Add bookmark for the attachment
-                            attachment_data = next((a for a in attachments if str(a.get('Attachment Number', '')) == attachment_num), None)
-                            title = attachment_data.get('Title', 'Untitled') if attachment_data else 'Untitled'
-                            toc.append([1, f"Attachment {attachment_num}: {title}", page_num])
-                            print(f"Added bookmark for Attachment {attachment_num} on page {page_num+1}")
-                            break
+                # Read the number from the heading and look it up directly
+                attachment_num = find_cover_heading(header)
+                if attachment_num not in attachment_pages:
+                    continue
+                
+                # Make sure this isn't just a mention in another cover page; the
+                # header text usually already shows it, so only extract the rest if not
+                if "Page" in header or "Page" in page.get_text("text", flags=TEXT_SCAN_FLAGS):
+                    actual_cover_pages[attachment_num] = page_num
+                    # Add bookmark for the attachment
+                    title = attachment_titles.get(attachment_num, 'Untitled')
+                    toc.append([1, f"Attachment {attachment_num}: {title}", page_num + 1])
+                    logger.debug("Added bookmark for Attachment %s on page %d", attachment_num, page_num + 1)
+                    
+                    # Stop once every attachment's cover page has been found
+                    if len(actual_cover_pages) == len(attachment_pages):
+                        break
             
             # Set bookmarks
             merged_pdf.set_toc(toc)
             print(f"Created {len(toc)} bookmarks")
             
             # Save merged PDF
-            merged_pdf.save(OUTPUT_PDF)
+            merged_pdf.save(OUTPUT_PDF, **PDF_SAVE_OPTIONS)
             merged_pdf.close()
             
             print(f"PDF generated at: {OUTPUT_PDF}")
             
             # Clean up
             title_pdf.close()
-            toc_pdf.close()
+            if foreword_pdf is not None:
+                foreword_pdf.close()
+            toc_doc.close()
             
         else:
             # If no title page, just use the TOC PDF as the output
             print(f"Title page not found at {TITLE_PAGE}, using TOC only")
-            import shutil
-            shutil.copy(OUTPUT_TOC, OUTPUT_PDF)
+            if foreword_pdf is not None:
+                foreword_pdf.close()
+            # Write the already open TOC document instead of copying the file back off disk
+            toc_doc.save(OUTPUT_PDF, **PDF_SAVE_OPTIONS)
+            toc_doc.close()
             print(f"PDF generated at: {OUTPUT_PDF}")
         
     except Exception as e:
         print(f"Error: {e}")
-        import traceback
         traceback.print_exc()
         return 1
     
@@ -8,6 +8,7 @@ This script merges the table of contents and cover pages PDF with the actual PDF
 import os
 import sys
 import json
+import traceback
 
 # Add the src directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
@@ -46,7 +47,6 @@ def main():
     
     except Exception as e:
         print(f"Error merging PDFs: {e}")
-        import traceback
         traceback.print_exc()
         return 1
 
@@ -17,6 +17,14 @@ HEADING_FONT_SIZE = 18  # Heading font size
 # TOC Constants
 TOC_ENTRIES_PER_PAGE = 25  # Approximate number of TOC entries per page
 
+# Options for the final save of each output PDF: drop unused objects, compact the
+# xref and compress uncompressed streams in a single pass. Duplicate-object removal
+# (garbage=4) is left out because its cost grows quadratically with merged page count.
+PDF_SAVE_OPTIONS = {'garbage': 2, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True}
+
+# Cover page detection
+COVER_HEADER_FRACTION = 0.4  # Top portion of a page holding the "Attachment X" heading
+
 # PDF Bookmark Levels
 BOOKMARK_LEVEL_1 = 1  # Top level bookmark
 BOOKMARK_LEVEL_2 = 2  # Second level bookmark 
\ No newline at end of file
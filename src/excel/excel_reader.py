@@ -4,6 +4,8 @@ Excel reader module to read attachment data from Excel files.
 """
 
 import os
+import sys
+from functools import lru_cache
 import openpyxl
 from src.config.paths import EXCEL_FILE, SHEET_NAME
 
@@ -94,6 +96,7 @@ def read_attachment_data(for_toc=True):
     print(f"Found {len(data)} attachments")
     return data
 
+@lru_cache(maxsize=None, typed=True)
 def normalize_attachment_number(attachment_num):
     """
     Normalize attachment number to string representation.
@@ -102,12 +105,14 @@ def normalize_attachment_number(attachment_num):
         attachment_num: The attachment number which could be a float, int, or string
         
     Returns:
-        str: Normalized attachment number as string
+        str: Normalized attachment number as string, interned so that lookups
+             with attachment numbers read from the PDFs compare by identity
     """
     if isinstance(attachment_num, float) and attachment_num.is_integer():
-        return str(int(attachment_num))
-    return str(attachment_num)
+        return sys.intern(str(int(attachment_num)))
+    return sys.intern(str(attachment_num))
 
+@lru_cache(maxsize=None, typed=True)
 def normalize_page_count(page_count):
     """
     Normalize page count to integer.
@@ -127,6 +132,21 @@ def normalize_page_count(page_count):
             return 1
     return page_count
 
+def attachment_sort_key(attachment_num):
+    """
+    Sort key for normalized attachment numbers.
+    
+    Args:
+        attachment_num: The normalized attachment number string
+        
+    Returns:
+        float: Numeric value of the attachment number, or infinity if it is not numeric
+    """
+    try:
+        return float(attachment_num)
+    except (ValueError, TypeError):
+        return float('inf')
+
 def load_attachments_from_excel():
     """
     Load attachments from Excel file and prepare them for PDF merging.
@@ -165,6 +185,6 @@ def load_attachments_from_excel():
         processed_attachments.append(processed)
     
     # Sort by attachment number
-    processed_attachments.sort(key=lambda x: float(x['Number']) if x['Number'].replace('.', '', 1).isdigit() else float('inf'))
+    processed_attachments.sort(key=lambda x: attachment_sort_key(x['Number']))
     
     return processed_attachments 
\ No newline at end of file
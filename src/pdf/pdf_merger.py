@@ -4,9 +4,152 @@ Module for merging PDFs with attachments.
 """
 
 import os
+import re
+import sys
+import logging
 import fitz
 from src.config.paths import OUTPUT_PDF, MERGED_PDF, TITLE_PAGE, FOREWORD_PAGE
-from src.excel.excel_reader import normalize_attachment_number
+from src.config.constants import COVER_HEADER_FRACTION, PDF_SAVE_OPTIONS
+from src.excel.excel_reader import normalize_attachment_number, attachment_sort_key
+
+# Precompiled patterns for attachment references in extracted page text
+ATTACHMENT_RE = re.compile(r'Attachment\s+(\d+\.?\d*)')
+TOC_CONTINUATION_RE = re.compile(r'Attachment\s+\d+\s+\d+\s*$', re.MULTILINE)
+COVER_HEADING_RE = re.compile(r'^Attachment (\S+)$', re.MULTILINE)
+OUTLINE_ATTACHMENT_RE = re.compile(r'Attachment (\S+?):')
+FOREWORD_RE = re.compile(r'foreword', re.IGNORECASE)
+
+# Extraction flags for text that is only searched for substrings: keep the
+# media box clip but skip ligature and whitespace preservation
+TEXT_SCAN_FLAGS = fitz.TEXT_MEDIABOX_CLIP
+
+# Child of the application logger configured by src.utils.logger.setup_logger
+logger = logging.getLogger('pdf_generator.pdf_merger')
+
+def get_page_text(pdf_doc, page_num, text_cache=None, page=None):
+    """
+    Get the full text of a page, extracting it at most once per cache.
+    
+    Args:
+        pdf_doc: PyMuPDF document
+        page_num: Index of the page
+        text_cache: Optional dictionary of already extracted page texts,
+                    shared between the passes over the same document
+        page: The page itself, if the caller has already loaded it
+        
+    Returns:
+        str: The page text
+    """
+    if text_cache is not None:
+        text = text_cache.get(page_num)
+        if text is not None:
+            return text
+    
+    if page is None:
+        page = pdf_doc[page_num]
+    text = page.get_text("text", flags=TEXT_SCAN_FLAGS)
+    
+    if text_cache is not None:
+        text_cache[page_num] = text
+    return text
+
+def get_header_text(page, fraction=COVER_HEADER_FRACTION):
+    """
+    Extract text from the top band of a page only.
+    
+    Cover pages carry their "Attachment X" heading near the top, so
+    restricting extraction to that band avoids converting the full text of
+    content-heavy pages that can never be cover pages.
+    
+    Args:
+        page: PyMuPDF page
+        fraction: Portion of the page height to extract, from the top
+        
+    Returns:
+        str: Text found within the top band of the page
+    """
+    rect = page.rect
+    clip = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * fraction)
+    return page.get_text("text", clip=clip, flags=TEXT_SCAN_FLAGS)
+
+def find_cover_heading(text, max_lines=5):
+    """
+    Extract the attachment number from a cover page heading.
+    
+    A cover page starts with a line reading exactly "Attachment X"; only the
+    first few lines are checked so mentions further down the page are ignored.
+    
+    Args:
+        text: Page text (or the text of its header band)
+        max_lines: Number of leading lines to check
+        
+    Returns:
+        str: The attachment number, or None if no heading line was found
+    """
+    # Search for the first heading line directly instead of splitting the text
+    # into lines; it only counts when it falls within the leading lines
+    match = COVER_HEADING_RE.search(text)
+    if match and text.count('\n', 0, match.start()) < max_lines:
+        return sys.intern(match.group(1))
+    return None
+
+def find_attachment_rects(page):
+    """
+    Locate every "Attachment X" label on a page with a single text pass.
+    
+    Args:
+        page: PyMuPDF page
+        
+    Returns:
+        dict: Dictionary mapping attachment numbers to the rectangle of their
+              first "Attachment X" label on the page
+    """
+    attachment_rects = {}
+    words = page.get_text("words")
+    
+    # Each word is (x0, y0, x1, y1, text, block_no, line_no, word_no)
+    for word, next_word in zip(words, words[1:]):
+        if word[4] != "Attachment" or not next_word[4][:1].isdigit():
+            continue
+        if word[5:7] != next_word[5:7]:
+            continue  # Label and number must be on the same line
+        
+        attachment_id = sys.intern(next_word[4].rstrip(':'))
+        if attachment_id not in attachment_rects:
+            attachment_rects[attachment_id] = fitz.Rect(word[:4]) | fitz.Rect(next_word[:4])
+    
+    return attachment_rects
+
+def get_cover_link_id(link):
+    """
+    Get the attachment number a "#cover-X" link points to.
+    
+    Args:
+        link: Link dictionary as returned by page.get_links()
+        
+    Returns:
+        str: The attachment number, or None if this is not a cover page link
+    """
+    uri = link.get('uri')
+    if uri and uri.startswith('#cover-'):
+        return uri[7:]  # Remove '#cover-'
+    return None
+
+def find_link_at(links, rect):
+    """
+    Find the existing link whose hot area overlaps the given rectangle.
+    
+    Args:
+        links: List of link dictionaries as returned by page.get_links()
+        rect: Rectangle of the text the link should cover
+        
+    Returns:
+        dict: The overlapping link, or None if there is none
+    """
+    for link in links:
+        if fitz.Rect(link['from']).intersects(rect):
+            return link
+    return None
 
 def build_attachment_map(attachments):
     """
@@ -24,12 +167,15 @@ def build_attachment_map(attachments):
         attachment_map[attachment_num] = attachment
     return attachment_map
 
-def locate_toc_page(pdf_doc):
+def locate_toc_page(pdf_doc, text_cache=None, rects_cache=None):
     """
     Locate all Table of Contents pages in the PDF.
     
     Args:
         pdf_doc: PyMuPDF document
+        text_cache: Optional dictionary of already extracted page texts
+        rects_cache: Optional dictionary filled with the attachment label
+                     rectangles of each TOC page, keyed by page index
         
     Returns:
         tuple: (list of TOC page indices, dict of TOC links)
@@ -39,45 +185,47 @@ def locate_toc_page(pdf_doc):
     toc_links = {}
     
     # TOC is only on pages 2 and 3 (index 1 and 2)
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
-        text = page.get_text()
+    for page_num, page in enumerate(pdf_doc.pages()):
+        text = get_page_text(pdf_doc, page_num, text_cache, page)
         
         # First page with "Table of Contents" is the main TOC page
         if "Table of Contents" in text and "Attachment " in text:
             first_toc_page = page_num
             toc_page_indices.append(page_num)
-            print(f"Found main TOC page at page {page_num+1}")
+            logger.info("Found main TOC page at page %d", page_num + 1)
+            if rects_cache is not None:
+                rects_cache[page_num] = find_attachment_rects(page)
             
             # Extract all links from this TOC page
             links = page.get_links()
-            print(f"Found {len(links)} links on TOC page {page_num+1}")
-            print(f"Links: {links}")
+            logger.info("Found %d links on TOC page %d", len(links), page_num + 1)
+            logger.debug("Links: %s", links)
             for link in links:
-                if 'uri' in link and link['uri'].startswith('#cover-'):
-                    attachment_id = link['uri'][7:]  # Remove '#cover-'
+                attachment_id = get_cover_link_id(link)
+                if attachment_id is not None:
                     toc_links[attachment_id] = link
-                    print(f"Found TOC link to Attachment {attachment_id}")
+                    logger.debug("Found TOC link to Attachment %s", attachment_id)
         
         # The next page after the TOC main page is continuation (if it has attachment entries)
-        elif first_toc_page > -1 and page_num not in toc_page_indices and "Attachment " in text:
+        elif first_toc_page > -1 and "Attachment " in text:
             # Find two adjacent numbers (like "14 50") which indicates this is TOC formatting
-            import re
-            if re.search(r'Attachment\s+\d+\s+\d+\s*$', text, re.MULTILINE):
+            if TOC_CONTINUATION_RE.search(text):
                 toc_page_indices.append(page_num)
-                print(f"Found possible TOC continuation page at page {page_num+1}")
+                logger.info("Found possible TOC continuation page at page %d", page_num + 1)
+                if rects_cache is not None:
+                    rects_cache[page_num] = find_attachment_rects(page)
                 
                 # Extract all links from this TOC page
                 links = page.get_links()
                 for link in links:
-                    if 'uri' in link and link['uri'].startswith('#cover-'):
-                        attachment_id = link['uri'][7:]  # Remove '#cover-'
+                    attachment_id = get_cover_link_id(link)
+                    if attachment_id is not None:
                         toc_links[attachment_id] = link
-                        print(f"Found TOC link to Attachment {attachment_id}")
+                        logger.debug("Found TOC link to Attachment %s", attachment_id)
             else:
                 break
     
-    print(f"Found {len(toc_page_indices)} TOC pages with {len(toc_links)} total links")
+    logger.info("Found %d TOC pages with %d total links", len(toc_page_indices), len(toc_links))
     return first_toc_page, toc_links, toc_page_indices
 
 def locate_cover_pages(pdf_doc, attachment_map):
@@ -93,20 +241,69 @@ def locate_cover_pages(pdf_doc, attachment_map):
     """
     cover_page_indices = {}
     
-    for page_num in range(pdf_doc.page_count):
-        page = pdf_doc[page_num]
+    for page_num, page in enumerate(pdf_doc.pages()):
+        # Only pages with an attachment heading need full text extraction
+        header = get_header_text(page)
+        if "Attachment " not in header:
+            continue
+        
+        # Read the number from the heading and look it up directly
+        attachment_id = find_cover_heading(header)
+        if attachment_id not in attachment_map:
+            continue
+        
         text = page.get_text()
         
         if "Table of Contents" in text:
             continue  # Skip TOC page
-            
-        for attachment_id in attachment_map:
-            if f"Attachment {attachment_id}" in text:
-                # Make sure this isn't just a mention in another cover page
-                if "Page" in text and f"Attachment {attachment_id}" in text.split('\n')[:5]:
-                    cover_page_indices[attachment_id] = page_num
-                    print(f"Found cover page for Attachment {attachment_id} on page {page_num+1}")
-                    break
+        
+        # Make sure this isn't just a mention in another cover page
+        if "Page" in text:
+            cover_page_indices[attachment_id] = page_num
+            logger.info("Found cover page for Attachment %s on page %d", attachment_id, page_num + 1)
+    
+    return cover_page_indices
+
+def locate_cover_pages_from_outline(pdf_doc, attachment_map, toc_page_indices=(), text_cache=None):
+    """
+    Locate cover pages from the "Attachment X: Title" bookmarks in the PDF.
+    
+    Each bookmark target is confirmed to be a cover page for that attachment,
+    so only the pages the outline points to are read instead of every page.
+    
+    Args:
+        pdf_doc: PyMuPDF document
+        attachment_map: Dictionary mapping attachment numbers to attachment data
+        toc_page_indices: Indices of the TOC pages, which are never cover pages
+        text_cache: Optional dictionary of already extracted page texts
+        
+    Returns:
+        dict: Dictionary mapping attachment numbers to page indices (empty if
+              the document has no usable bookmarks)
+    """
+    cover_page_indices = {}
+    
+    for level, title, target_page in pdf_doc.get_toc(simple=True):
+        match = OUTLINE_ATTACHMENT_RE.match(title)
+        if not match:
+            continue
+        
+        attachment_id = sys.intern(match.group(1))
+        if attachment_id not in attachment_map or attachment_id in cover_page_indices:
+            continue
+        
+        # Bookmark pages are 1-based
+        page_idx = target_page - 1
+        if not 0 <= page_idx < pdf_doc.page_count or page_idx in toc_page_indices:
+            continue
+        
+        # Apply the same checks as the text scan: the page must start with the
+        # attachment's heading and be a cover page, not just mention it
+        page = pdf_doc[page_idx]
+        if find_cover_heading(get_header_text(page)) != attachment_id:
+            continue
+        if "Page " in get_page_text(pdf_doc, page_idx, text_cache, page):
+            cover_page_indices[attachment_id] = page_idx
     
     return cover_page_indices
 
@@ -127,10 +324,10 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
     page_mapping = {}
     current_page = 0
     
-    # Add all the TOC pages first
+    # Add all the TOC pages first, in a single ranged insert
     toc_pdf = fitz.open(OUTPUT_PDF)
+    merged_pdf.insert_pdf(toc_pdf)
     for i in range(toc_pdf.page_count):
-        merged_pdf.insert_pdf(toc_pdf, from_page=i, to_page=i)
         page_mapping[i] = current_page
         current_page += 1
     
@@ -138,10 +335,10 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
     bookmark_positions = {}
     
     # Now add each attachment right after its cover page
-    for attachment_num, page_idx in sorted(cover_page_indices.items(), key=lambda x: float(x[0]) if x[0].replace('.', '', 1).isdigit() else float('inf')):
+    for attachment_num, page_idx in sorted(cover_page_indices.items(), key=lambda x: attachment_sort_key(x[0])):
         attachment = attachment_map.get(attachment_num)
         if not attachment:
-            print(f"Warning: No data found for Attachment {attachment_num}, skipping")
+            logger.warning("No data found for Attachment %s, skipping", attachment_num)
             continue
             
         filename = attachment.get('Filename Reference', '')
@@ -149,7 +346,7 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
         
         # Skip if no filename
         if not filename:
-            print(f"Warning: No filename for Attachment {attachment_num}, skipping")
+            logger.warning("No filename for Attachment %s, skipping", attachment_num)
             continue
         
         # We already added the cover page in the first pass
@@ -162,7 +359,7 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
         
         # Check if attachment exists
         if not os.path.exists(attachment_path):
-            print(f"Warning: Attachment file not found: {attachment_path}, skipping")
+            logger.warning("Attachment file not found: %s, skipping", attachment_path)
             continue
         
         try:
@@ -173,7 +370,7 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
             attachment_pdf = fitz.open(attachment_path)
             attachment_pages = len(attachment_pdf)
             
-            print(f"Inserting {attachment_pages} pages for Attachment {attachment_num} after position {insert_pos}")
+            logger.debug("Inserting %d pages for Attachment %s after position %d", attachment_pages, attachment_num, insert_pos)
             
             # Insert after the cover page
             merged_pdf.insert_pdf(attachment_pdf, start_at=insert_pos)
@@ -191,62 +388,59 @@ def insert_attachments(merged_pdf, attachments, attachment_map, cover_page_indic
             # Update current page counter
             current_page += attachment_pages
             
-            print(f"Added: Attachment {attachment_num} - {filename} ({attachment_pages} pages)")
+            logger.info("Added: Attachment %s - %s (%d pages)", attachment_num, filename, attachment_pages)
             
         except Exception as e:
-            print(f"Error adding attachment {attachment_num}: {e}")
+            logger.error("Error adding attachment %s: %s", attachment_num, e)
     
     return page_mapping, bookmark_positions
 
-def create_bookmarks(doc, toc_pdf, cover_page_info, title_page_exists=True, foreword_exists=True):
-    """Create bookmarks in the merged PDF document."""
+def create_bookmarks(doc, toc_pdf, cover_page_info, title_page_exists=True, foreword_exists=True, toc_page_idx=None):
+    """
+    Create bookmarks in the merged PDF document.
+    
+    Args:
+        doc: PyMuPDF document to set the bookmarks on
+        toc_pdf: PyMuPDF document the TOC and cover pages were read from
+        cover_page_info: List of dictionaries describing each located cover page
+        title_page_exists: Whether to add a Title Page bookmark
+        foreword_exists: Whether to add a Foreword bookmark
+        toc_page_idx: 0-based index of the main TOC page, as already located
+                      by the caller (defaults to page 3 when not given)
+        
+    Returns:
+        list: The bookmarks that were set
+    """
     if not doc or not toc_pdf:
         return
 
-    # Initialize bookmarks list
-    bookmarks = []
-    
-    # Add title page bookmark
-    title_page_index = 1  # Title page is at page 1
-    bookmarks.append([1, "Title Page", title_page_index])
-    print(f"Adding bookmark: Title Page -> page {title_page_index}")
+    # Add title page bookmark (title page is at page 1, foreword starts at page 2)
+    bookmarks = [[1, "Title Page", 1]]
     
     # Add foreword bookmark if it exists
-    foreword_index = 2  # Foreword starts at page 2
     if foreword_exists:
-        bookmarks.append([1, "Foreword", foreword_index])
-        print(f"Adding bookmark: Foreword -> page {foreword_index}")
+        bookmarks.append([1, "Foreword", 2])
     
-    # Add TOC bookmark
-    toc_index = 3
+    # Add TOC bookmark, reusing the TOC page the caller already located
+    if toc_page_idx is not None and toc_page_idx >= 0:
+        toc_index = toc_page_idx + 1
+    else:
+        toc_index = 3
     bookmarks.append([1, "Table of Contents", toc_index])
-    print(f"Adding bookmark: Table of Contents -> page {toc_index}")
-    
-    # Add attachment bookmarks
-    for info in cover_page_info:
-        if 'attachment_num' in info and 'merged_page' in info and 'title' in info:
-            attachment_num = info['attachment_num']
-            merged_page = info['merged_page']
-            title = info['title']
-            
-            # Create bookmark title
-            bookmark_title = f"Attachment {attachment_num}: {title}"
-            
-            # Create bookmark with page offset
-            bookmarks.append([1, bookmark_title, merged_page+1])
-            print(f"Adding bookmark for Attachment {attachment_num} to page {merged_page+1}")
-    
-    # Set bookmarks in the document
-    if bookmarks:
-        print(f"Setting {len(bookmarks)} bookmarks with adjusted page positions for PDF viewers")
-        doc.set_toc(bookmarks)
-        
-        # Print confirmation of bookmarks
-        print("Successfully set", len(bookmarks), "bookmarks:")
-        for bookmark in bookmarks:
-            level, title, page = bookmark
-            # Display page number as 1-based for easier understanding
-            print(f"  {title} -> page {page}")
+    
+    # Add attachment bookmarks, converting each cover page to a 1-based page number
+    bookmarks.extend(
+        [1, f"Attachment {info['attachment_num']}: {info['title']}", info['merged_page'] + 1]
+        for info in cover_page_info
+        if 'attachment_num' in info and 'merged_page' in info and 'title' in info
+    )
+    
+    # Set all bookmarks in the document in one call
+    doc.set_toc(bookmarks)
+    logger.info("Set %d bookmarks", len(bookmarks))
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Bookmarks:\n%s", "\n".join(f"  {title} -> page {page}" for _, title, page in bookmarks))
     
     return bookmarks
 
@@ -259,86 +453,100 @@ def merge_pdfs(toc_pdf_path, attachments, output_file=MERGED_PDF):
         attachments: List of dictionaries with attachment information
         output_file: Path to the output PDF file
     """
-    print(f"Merging PDFs into: {output_file}")
+    logger.info("Merging PDFs into: %s", output_file)
     
     # Create attachments map for easier lookups
     attachment_map = {a['Number']: a for a in attachments}
     
     # Open TOC PDF
     toc_pdf = fitz.open(toc_pdf_path)
-    print(f"TOC PDF has {toc_pdf.page_count} pages")
+    logger.info("TOC PDF has %d pages", toc_pdf.page_count)
     
     # Scan the TOC PDF to find the main TOC page, and map pages to attachments
-    print("Scanning TOC PDF to locate cover pages and links...")
+    logger.info("Scanning TOC PDF to locate cover pages and links...")
     title_page_found = False
     foreword_found = False
-    toc_page_indices = []
+    toc_page_indices = set()
     
     # Looking for title page, foreword, TOC page
     title_page_index = None
     foreword_page_index = None
     main_toc_page_index = None
     
-    # Track found cover pages to avoid duplicates
-    found_cover_pages = set()
     cover_page_info = []
     
-    # First, check for title page and foreword
-    for i in range(toc_pdf.page_count):
-        page_text = toc_pdf[i].get_text()
-        
-        # Check for title page (usually first page)
-        if i == 0:
-            title_page_index = i
-            title_page_found = True
-            print(f"Found title page at page {i+1}")
-        
-        # Check for foreword (usually second page)
-        if i == 1 and "foreword" in page_text.lower():
-            foreword_page_index = i
-            foreword_found = True
-            print(f"Found foreword on page {i+1}")
+    # Page texts extracted by one pass over the TOC PDF are reused by the next
+    text_cache = {}
+    
+    # First, check for title page (usually first page) and foreword (usually
+    # second page); no other page's text is needed for this
+    if toc_pdf.page_count > 0:
+        title_page_index = 0
+        title_page_found = True
+        logger.info("Found title page at page 1")
+    
+    if toc_pdf.page_count > 1 and FOREWORD_RE.search(get_page_text(toc_pdf, 1, text_cache)):
+        foreword_page_index = 1
+        foreword_found = True
+        logger.info("Found foreword on page 2")
 
     # Get the main TOC page index and the TOC page indices
-    main_toc_page_index, toc_links, tp_indices = locate_toc_page(toc_pdf)
-    toc_page_indices = toc_page_indices + tp_indices
+    toc_rects = {}
+    main_toc_page_index, toc_links, tp_indices = locate_toc_page(toc_pdf, text_cache, toc_rects)
+    toc_page_indices.update(tp_indices)
 
-    # Now look for all attachment cover pages
-    for i in range(toc_pdf.page_count):
-        page_text = toc_pdf[i].get_text()
+    # The TOC generator bookmarks every cover page, so try the outline first and
+    # only fall back to scanning page text when it does not cover every attachment
+    cover_pages = locate_cover_pages_from_outline(toc_pdf, attachment_map, toc_page_indices, text_cache)
+    if len(cover_pages) < len(attachment_map):
+        cover_pages = {}
         
-        # Skip TOC pages - they also contain attachment references
-        if i in toc_page_indices or "Table of Contents" in page_text:
-            continue
+        # Now look for all attachment cover pages
+        for i, page in enumerate(toc_pdf.pages()):
+            # Skip TOC pages - they also contain attachment references
+            if i in toc_page_indices:
+                continue
+            
+            # Only pages with an attachment heading need full text extraction
+            if "Attachment " not in get_header_text(page):
+                continue
             
-        # Check for attachment cover pages - ensure it's a cover page, not just a mention
-        if "Attachment " in page_text and "Page " in page_text:
-            # Extract the attachment number from the page text
-            import re
-            attachment_matches = re.findall(r'Attachment\s+(\d+\.?\d*)', page_text)
+            page_text = get_page_text(toc_pdf, i, text_cache, page)
             
-            if attachment_matches:
-                attachment_num = attachment_matches[0]
+            if "Table of Contents" in page_text:
+                continue
                 
-                # Skip if we already found this attachment's cover page
-                if attachment_num in found_cover_pages:
-                    continue
-                    
-                # Only process if this attachment number is in our list from Excel
-                if attachment_num in attachment_map:
-                    found_cover_pages.add(attachment_num)
-                    attachment_title = attachment_map[attachment_num].get('Title', 'Untitled')
-                    print(f"Found cover page for Attachment {attachment_num} on page {i+1}")
+            # Check for attachment cover pages - ensure it's a cover page, not just a mention
+            if "Attachment " in page_text and "Page " in page_text:
+                # Extract the attachment number from the page text
+                match = ATTACHMENT_RE.search(page_text)
+                
+                # Only keep the first cover page for attachment numbers in our list from Excel
+                if match and match.group(1) in attachment_map:
+                    cover_pages.setdefault(match.group(1), i)
                     
-                    cover_page_info.append({
-                        'attachment_num': attachment_num,
-                        'toc_page': i,
-                        'merged_page': i,  # Initial value, will be updated as we insert pages
-                        'title': attachment_title
-                    })
+                    # Stop once every expected attachment has a cover page
+                    if len(cover_pages) == len(attachment_map):
+                        break
+    
+    # Order the cover pages by attachment number once, converting each number a single
+    # time; the page index breaks ties between numbers that don't parse
+    ordered_cover_pages = sorted((attachment_sort_key(attachment_num), i, attachment_num)
+                                 for attachment_num, i in cover_pages.items())
+    
+    for _, i, attachment_num in ordered_cover_pages:
+        attachment_title = attachment_map[attachment_num].get('Title', 'Untitled')
+        logger.info("Found cover page for Attachment %s on page %d", attachment_num, i + 1)
+        
+        cover_page_info.append({
+            'attachment_num': attachment_num,
+            'toc_page': i,
+            'merged_page': i,  # Initial value, will be updated as we insert pages
+            'title': attachment_title
+        })
     
     # Report cover pages found
-    print(f"Found {len(cover_page_info)} cover pages")
+    logger.info("Found %d cover pages", len(cover_page_info))
     
     # Create a merged PDF document starting with the TOC PDF
     merged_pdf = fitz.open()
@@ -351,9 +559,6 @@ def merge_pdfs(toc_pdf_path, attachments, output_file=MERGED_PDF):
     page_mapping = {}  # Maps toc_page -> merged_page
     bookmark_positions = {}  # Maps attachment_num -> page_index
     
-    # Sort cover page info by attachment number to ensure consistent order
-    cover_page_info.sort(key=lambda x: float(x['attachment_num']) if x['attachment_num'].replace('.', '', 1).isdigit() else float('inf'))
-    
     # Process each attachment
     for i, info in enumerate(cover_page_info):
         attachment_num = info['attachment_num']
@@ -361,7 +566,7 @@ def merge_pdfs(toc_pdf_path, attachments, output_file=MERGED_PDF):
         filepath = attachment.get('FilePath')
         
         if not filepath or not os.path.exists(filepath):
-            print(f"Warning: File for Attachment {attachment_num} not found: {filepath}")
+            logger.warning("File for Attachment %s not found: %s", attachment_num, filepath)
             continue
         
         # Open the attachment PDF
@@ -374,7 +579,7 @@ def merge_pdfs(toc_pdf_path, attachments, output_file=MERGED_PDF):
             
             # Define where to insert this attachment's pages after its cover page
             insert_position = insert_after + 1 + page_offset
-            print(f"Inserting {num_pages} pages for Attachment {attachment_num} after position {insert_position}")
+            logger.debug("Inserting %d pages for Attachment %s after position %d", num_pages, attachment_num, insert_position)
             
             # Insert the attachment PDF after its cover page
             merged_pdf.insert_pdf(attachment_pdf, from_page=0, to_page=num_pages-1, start_at=insert_position)
@@ -395,96 +600,97 @@ def merge_pdfs(toc_pdf_path, attachments, output_file=MERGED_PDF):
             # Close the attachment PDF
             attachment_pdf.close()
             
-            # Print confirmation
-            print(f"Added: {os.path.basename(filepath)} ({num_pages} pages)")
+            # Log confirmation
+            logger.info("Added: %s (%d pages)", os.path.basename(filepath), num_pages)
             
         except Exception as e:
-            print(f"Error adding Attachment {attachment_num}: {e}")
+            logger.error("Error adding Attachment %s: %s", attachment_num, e)
     
     # Create bookmarks for the merged PDF
     create_bookmarks(merged_pdf, toc_pdf, cover_page_info, 
                     title_page_exists=(title_page_index is not None),
-                    foreword_exists=(foreword_page_index is not None))
-    
-    # Fix links in the merged PDF - look for all TOC pages
-    first_toc_page, toc_links, toc_pages_merged = locate_toc_page(merged_pdf)
-
-    # Fix links on all TOC pages
-    for toc_page in toc_pages_merged:
+                    foreword_exists=(foreword_page_index is not None),
+                    toc_page_idx=main_toc_page_index)
+    
+    # Fix links in the merged PDF. Attachments are only inserted after cover
+    # pages, which all follow the TOC, so the TOC pages found in the source
+    # PDF keep their indices and the merged PDF does not need to be rescanned.
+    # Map every cover URI to its attachment number once so each link is
+    # classified with a single dictionary lookup.
+    cover_uris = {f'#cover-{attachment_id}': attachment_id for attachment_id in bookmark_positions}
+    for toc_page in tp_indices:
         page = merged_pdf[toc_page]
         links = page.get_links()
-        print(f"Fixing links on TOC page (page {toc_page+1})")
-        print(f"Found {len(links)} links on TOC page {toc_page+1}")
-        
-        # Look for potential attachment references in the TOC
-        text = page.get_text()
-        
-        # Extract text line by line for more accurate processing
-        lines = text.split('\n')
+        logger.info("Fixing links on TOC page (page %d)", toc_page + 1)
+        logger.debug("Found %d links on TOC page %d", len(links), toc_page + 1)
         
-        # Look for potential attachment entries in various formats
-        import re
-        potential_attachments = set()
+        # Reuse the attachment labels located while scanning the TOC; inserting
+        # the PDF does not move them
+        attachment_rects = toc_rects.get(toc_page)
+        if attachment_rects is None:
+            attachment_rects = find_attachment_rects(page)
         
-        for line in lines:
-            # Search for standard format "Attachment X" or "Attachment X:"
-            std_matches = re.findall(r"Attachment\s+(\d+\.?\d*)", line)
-            if std_matches:
-                for match in std_matches:
-                    potential_attachments.add(match)
-        
-        if potential_attachments:
-            print(f"Found potential attachments on page {toc_page+1}: {', '.join(sorted(potential_attachments))}")
+        if attachment_rects:
+            logger.debug("Found potential attachments on page %d: %s", toc_page + 1, ', '.join(sorted(attachment_rects)))
+            
+            # Index the page's existing cover links by attachment number once
+            cover_links = {}
+            for link in links:
+                attachment_id = cover_uris.get(link.get('uri'))
+                if attachment_id is not None:
+                    cover_links.setdefault(attachment_id, link)
             
             # Create links for attachments found on this page
-            for attachment_id in potential_attachments:
+            for attachment_id, rect in attachment_rects.items():
                 if attachment_id in bookmark_positions:
                     target_page = bookmark_positions[attachment_id]
-                    
-                    # Find the text in the TOC page
                     search_text = f"Attachment {attachment_id}"
-                    rects = page.search_for(search_text)
                     
-                    if rects:
-                        # Create a new link
-                        new_link = {
-                            'kind': fitz.LINK_GOTO,
-                            'from': rects[0],  # use the first occurrence
-                            'page': target_page,
-                            'to': fitz.Point(0, 0),
-                            'zoom': 0
-                        }
-                        
-                        # Add the new link
+                    # Create a new link
+                    new_link = {
+                        'kind': fitz.LINK_GOTO,
+                        'from': rect,  # use the first occurrence
+                        'page': target_page,
+                        'to': fitz.Point(0, 0),
+                        'zoom': 0
+                    }
+                    
+                    # Rewrite the link already covering this entry in place, if any,
+                    # rather than stacking a second annotation on top of it
+                    existing_link = cover_links.get(attachment_id)
+                    if existing_link is None:
+                        existing_link = find_link_at(links, rect)
+                    if existing_link is not None:
+                        new_link['xref'] = existing_link['xref']
+                        page.update_link(new_link)
+                        logger.debug("Updated link for %s to point to page %d", search_text, target_page + 1)
+                    else:
                         page.insert_link(new_link)
-                        print(f"Created link for {search_text} pointing to page {target_page+1}")
+                        logger.debug("Created link for %s pointing to page %d", search_text, target_page + 1)
     
     # Save the merged PDF
     try:
-        merged_pdf.save(output_file)
+        merged_pdf.save(output_file, **PDF_SAVE_OPTIONS)
         page_count = merged_pdf.page_count
+        
+        # Read the bookmarks from the document we just saved rather than
+        # reopening and reparsing the output file
+        toc = merged_pdf.get_toc()
         merged_pdf.close()
         
-        print(f"Merged PDF created at: {output_file} ({page_count} pages)")
+        logger.info("Merged PDF created at: %s (%d pages)", output_file, page_count)
         
-        # Print debug info about bookmarks in the final PDF
-        print("\nDEBUG - Bookmarks in final PDF:")
-        doc = fitz.open(output_file)
-        toc = doc.get_toc()
-        print(f"Total bookmarks: {len(toc)}")
-        print("First few bookmarks:")
+        # Log debug info about bookmarks in the final PDF
+        logger.debug("Bookmarks in final PDF: %d total", len(toc))
+        logger.debug("First few bookmarks:")
         for level, title, page in toc[:5]:
-            print(f"  {title} -> page {page+1}")
+            logger.debug("  %s -> page %d", title, page + 1)
         
         # Check for Foreword bookmark specifically
         for item in toc:
             if 'Foreword' in item[1]:
                 level, title, page = item
-                print(f"  Foreword bookmark -> page {page+1}")
+                logger.debug("  Foreword bookmark -> page %d", page + 1)
                 break
-                
-        doc.close()
     except Exception as e:
-        print(f"Error saving PDF: {e}")
-        import traceback
-        traceback.print_exc() 
\ No newline at end of file
+        logger.exception("Error saving PDF: %s", e) 
\ No newline at end of file
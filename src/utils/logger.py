@@ -5,6 +5,30 @@ Logger module for the application.
 
 import logging
 import sys
+import time
+
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that renders the timestamp of each second only once.
+    
+    Records logged within the same second reuse the formatted date and time,
+    so only the milliseconds are formatted per record.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_second = None
+        self._cached_time = None
+    
+    def formatTime(self, record, datefmt=None):
+        if datefmt is not None:
+            return super().formatTime(record, datefmt)
+        
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = time.strftime(self.default_time_format, self.converter(second))
+            self._cached_second = second
+        return self.default_msec_format % (self._cached_time, record.msecs)
 
 def setup_logger(name='pdf_generator', level=logging.INFO):
     """
@@ -21,12 +45,22 @@ def setup_logger(name='pdf_generator', level=logging.INFO):
     logger = logging.getLogger(name)
     logger.setLevel(level)
     
+    # Already configured by an earlier call; reuse its handler instead of adding another,
+    # applying the requested level to it as well
+    if logger.handlers:
+        for handler in logger.handlers:
+            handler.setLevel(level)
+        return logger
+    
+    # The console handler below is the only output; don't emit records again via the root logger
+    logger.propagate = False
+    
     # Create console handler and set level
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
     
     # Create formatter
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     
     # Add formatter to console handler
     console_handler.setFormatter(formatter)